@@ -15,14 +15,27 @@ Outputs (under --out):
   assignments/manifest.json
 """
 
-import argparse, json, os, random, re, copy
-from typing import List, Dict, Tuple, Set, Optional
+import argparse, json, os, random, re, sys
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from typing import List, Dict, Tuple, Set, FrozenSet, Optional
+
+try:
+  import orjson  # optional: much faster JSON encoding
+except ImportError:
+  orjson = None
 
 
 # ----------------------------
 # Parsing
 # ----------------------------
 
+_STRIP = " ,;"
+# one match per line: group 1 = cluster header id, group 2 = bullet doc
+_RX_LINE = re.compile(r"^\s*(?:cluster\s+([\-]?\d+)|[-•]\s*(.+))", re.IGNORECASE)
+
+
 def parse_inventory(path: str) -> List[Dict]:
   """
   Parses inventories with blocks like:
@@ -30,27 +43,28 @@ def parse_inventory(path: str) -> List[Dict]:
       - file1.txt
       - file2.txt
   """
-  with open(path, "r", encoding="utf-8") as f:
-    lines = [ln.rstrip("\n") for ln in f]
-
   clusters = []
   current = None
-  rx_cluster = re.compile(r"^\s*cluster\s+([\-]?\d+)", re.IGNORECASE)
-  rx_bullet  = re.compile(r"^\s*[-•]\s*(.+)$")
 
-  for ln in lines:
-    m = rx_cluster.search(ln)
-    if m:
-      if current:
-        clusters.append(current)
-      current = {"cluster_id": str(m.group(1)), "items": []}
-      continue
+  with open(path, "r", encoding="utf-8", buffering=1 << 20) as f:
+    for ln in f:
+      m = _RX_LINE.match(ln)
+      if not m:
+        continue
+
+      cluster_id, doc = m.groups()
+      if cluster_id is not None:
+        if current:
+          clusters.append(current)
+        current = {"cluster_id": str(cluster_id), "items": []}
+        continue
 
-    if current:
-      b = rx_bullet.match(ln)
-      if b:
-        doc = b.group(1).strip().strip(" ,;")
+      if current:
+        doc = doc.strip().strip(_STRIP)
         if doc:
+          # interned: the same doc_id in A/B/C is one object, so the set/dict
+          # lookups on doc ids downstream mostly match on identity
+          doc = sys.intern(doc)
           current["items"].append({"doc_id": doc, "title": doc})
 
   if current:
@@ -66,12 +80,22 @@ def ensure_dir(p: str):
   os.makedirs(p, exist_ok=True)
 
 
+def write_json(path: str, obj) -> None:
+  # orjson output matches json.dump(ensure_ascii=False, indent=2) for our data
+  if orjson is not None:
+    with open(path, "wb") as f:
+      f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+  else:
+    with open(path, "w", encoding="utf-8") as f:
+      json.dump(obj, f, ensure_ascii=False, indent=2)
+
+
 def _all_doc_ids(clusters: List[Dict]) -> List[str]:
   return [it["doc_id"] for c in clusters for it in c["items"]]
 
 
-def validate_same_corpus(A: List[Dict], B: List[Dict], C: List[Dict]) -> None:
-  sA, sB, sC = set(_all_doc_ids(A)), set(_all_doc_ids(B)), set(_all_doc_ids(C))
+def validate_same_corpus(doc_sets: Dict[str, FrozenSet[str]]) -> None:
+  sA, sB, sC = doc_sets["A"], doc_sets["B"], doc_sets["C"]
   if not (sA == sB == sC):
     onlyA = sorted(list(sA - sB))[:10]
     onlyB = sorted(list(sB - sA))[:10]
@@ -99,10 +123,11 @@ def make_t1_coverage_tasks(cid: str, clusters: List[Dict], m: int, seed: int) ->
   Each task is a batch of up to m items drawn without replacement from a single cluster.
   """
   rng = random.Random(seed)
+  _shuffle = rng.shuffle
   tasks = []
   for c in clusters:
-    items = copy.deepcopy(c["items"])
-    rng.shuffle(items)
+    items = [dict(it) for it in c["items"]]
+    _shuffle(items)
     batches = _chunk(items, m)
     for b_ix, batch in enumerate(batches):
       task_uid = f"{cid}_c{c['cluster_id']}_b{b_ix:03d}"
@@ -119,40 +144,43 @@ def make_t1_coverage_tasks(cid: str, clusters: List[Dict], m: int, seed: int) ->
   return tasks
 
 
-def pick_anchor_tasks(tasks: List[Dict], n_anchors: int, seed: int) -> List[Dict]:
+def pick_anchor_tasks(tasks: List[Dict], n_anchors: int, seed: int) -> Tuple[List[Dict], List[Dict]]:
   """
   Picks anchor tasks with cluster diversity (round-robin across clusters).
+  Returns (anchors, pool) where pool is the remaining tasks in original order.
   """
   if n_anchors <= 0:
-    return []
+    return [], tasks[:]
 
   rng = random.Random(seed)
-  by_cluster: Dict[str, List[Dict]] = {}
-  for t in tasks:
-    by_cluster.setdefault(t["cluster_id"], []).append(t)
+  by_cluster: Dict[str, List[int]] = {}
+  for i, t in enumerate(tasks):
+    by_cluster.setdefault(t["cluster_id"], []).append(i)
 
-  for cid in by_cluster:
-    rng.shuffle(by_cluster[cid])
+  _shuffle = rng.shuffle
+  for idxs in by_cluster.values():
+    _shuffle(idxs)
 
   cluster_ids = sorted(by_cluster.keys())
+  picked = [False] * len(tasks)
   anchors = []
-  k = 0
-  while len(anchors) < n_anchors and cluster_ids:
-    cid = cluster_ids[k % len(cluster_ids)]
-    if by_cluster[cid]:
-      anchors.append(by_cluster[cid].pop())
-    k += 1
-    if k > 10_000:
+  exhausted = set()
+  for cid in cycle(cluster_ids):
+    if len(anchors) >= n_anchors or len(exhausted) == len(cluster_ids):
       break
+    idxs = by_cluster[cid]
+    if not idxs:
+      exhausted.add(cid)
+      continue
+    i = idxs.pop()
+    picked[i] = True
+    anchors.append(tasks[i])
 
   # mark
   for t in anchors:
     t["is_anchor"] = True
-  return anchors
-
-
-def remove_tasks_by_uid(tasks: List[Dict], uids: Set[str]) -> List[Dict]:
-  return [t for t in tasks if t["task_uid"] not in uids]
+  pool = [t for i, t in enumerate(tasks) if not picked[i]]
+  return anchors, pool
 
 
 # ----------------------------
@@ -183,9 +211,12 @@ def build_unique_pairs(cid: str, clusters: List[Dict], n_pairs: int, seed: int,
 
   seen: Set[Tuple[str, str]] = set()
   tasks: List[Dict] = []
+  pos_count = 0
+  neg_count = 0
 
   # helper to add
   def try_add_pair(a: Dict, b: Dict, same: bool) -> bool:
+    nonlocal pos_count, neg_count
     if a["doc_id"] == b["doc_id"]:
       return False
     k = norm_key(a, b)
@@ -198,27 +229,37 @@ def build_unique_pairs(cid: str, clusters: List[Dict], n_pairs: int, seed: int,
       "task_uid": task_uid,
       "clustering_id": cid,
       "pair_id": task_uid,
-      "doc1": copy.deepcopy(a),
-      "doc2": copy.deepcopy(b),
+      "doc1": {"doc_id": a["doc_id"], "title": a["title"]},
+      "doc2": {"doc_id": b["doc_id"], "title": b["title"]},
       "same_cluster": bool(same)
     })
+    if same:
+      pos_count += 1
+    else:
+      neg_count += 1
     return True
 
+  # hot-loop locals (avoid per-try list rebuilds / attribute lookups)
+  eligible = [c for c in clusters if len(c["items"]) >= 2] or clusters
+  rng_choice = rng.choice
+  rng_sample = rng.sample
+  cmap_get = cmap.__getitem__
+
   # positive
   pos_tries = 0
-  while sum(1 for t in tasks if t["same_cluster"]) < want_pos and pos_tries < n_pairs * 200:
+  while pos_count < want_pos and pos_tries < n_pairs * 200:
     pos_tries += 1
-    c = rng.choice([c for c in clusters if len(c["items"]) >= 2] or clusters)
-    a, b = rng.sample(c["items"], 2)
+    c = rng_choice(eligible)
+    a, b = rng_sample(c["items"], 2)
     try_add_pair(a, b, True)
 
   # negative
   neg_tries = 0
-  while sum(1 for t in tasks if not t["same_cluster"]) < want_neg and neg_tries < n_pairs * 400:
+  while neg_count < want_neg and neg_tries < n_pairs * 400:
     neg_tries += 1
-    c1, c2 = rng.sample(cluster_ids, 2)
-    a = rng.choice(cmap[c1])
-    b = rng.choice(cmap[c2])
+    c1, c2 = rng_sample(cluster_ids, 2)
+    a = rng_choice(cmap_get(c1))
+    b = rng_choice(cmap_get(c2))
     try_add_pair(a, b, False)
 
   rng.shuffle(tasks)
@@ -240,7 +281,15 @@ def round_robin_split(items: List[Dict], buckets: List[str], seed: int) -> Dict[
 
 
 def clone_task(t: Dict) -> Dict:
-  return copy.deepcopy(t)
+  # tasks are flat dicts whose only nested values are doc dicts (items/doc1/doc2),
+  # so a shallow rebuild is enough and much cheaper than deepcopy
+  tt = dict(t)
+  if "items" in tt:
+    tt["items"] = [dict(it) for it in tt["items"]]
+  for k in ("doc1", "doc2"):
+    if k in tt:
+      tt[k] = dict(tt[k])
+  return tt
 
 
 def validate_no_duplicate_task_uids(assignment_tasks: List[Dict], expert_id: str) -> None:
@@ -256,19 +305,18 @@ def validate_no_duplicate_task_uids(assignment_tasks: List[Dict], expert_id: str
     raise ValueError(f"[{expert_id}] Duplicate task_uid(s) in assignment: {dups[:10]}")
 
 
-def validate_t1_coverage(tasks: List[Dict], clusters: List[Dict], cid: str) -> None:
+def validate_t1_coverage(tasks: List[Dict], expected_set: FrozenSet[str], cid: str) -> None:
   """
   Ensures each doc appears exactly once in T1 coverage tasks (before anchors are reused across experts).
   """
-  expected = sorted(_all_doc_ids(clusters))
   got = []
   for t in tasks:
     if t["type"] == "cluster":
       got.extend([it["doc_id"] for it in t["items"]])
-  expected_set = set(expected)
-  got_set = set(got)
+  counts = Counter(got)
+  got_set = counts.keys()
 
-  if expected_set != got_set:
+  if got_set != expected_set:
     miss = sorted(list(expected_set - got_set))[:10]
     extra = sorted(list(got_set - expected_set))[:10]
     raise ValueError(
@@ -277,9 +325,6 @@ def validate_t1_coverage(tasks: List[Dict], clusters: List[Dict], cid: str) -> N
     )
 
   # Check multiplicity
-  counts = {}
-  for d in got:
-    counts[d] = counts.get(d, 0) + 1
   bad = [d for d,c in counts.items() if c != 1]
   if bad:
     raise ValueError(f"[{cid}] T1 coverage has docs with count != 1 (ex): {bad[:10]}")
@@ -327,19 +372,20 @@ def main():
       "clusters": clusters
     }
 
+  # Doc-id set per clustering (computed once, reused by the validators below)
+  doc_sets = {cid: frozenset(_all_doc_ids(obj["clusters"])) for cid, obj in clustering_objs.items()}
+
   # Validate same corpus across A/B/C
-  validate_same_corpus(
-    clustering_objs["A"]["clusters"],
-    clustering_objs["B"]["clusters"],
-    clustering_objs["C"]["clusters"],
-  )
+  validate_same_corpus(doc_sets)
+
+  # JSON outputs are collected as (path, obj) and written together at the end
+  outputs: List[Tuple[str, Dict]] = []
 
-  # Write clusterings
+  # Clusterings
   out_clusterings = os.path.join(args.out, "clusterings")
   ensure_dir(out_clusterings)
   for cid, obj in clustering_objs.items():
-    with open(os.path.join(out_clusterings, f"{cid}.json"), "w", encoding="utf-8") as f:
-      json.dump(obj, f, ensure_ascii=False, indent=2)
+    outputs.append((os.path.join(out_clusterings, f"{cid}.json"), obj))
 
   # Build T1 coverage tasks + anchors
   t1_all = {}
@@ -348,12 +394,10 @@ def main():
   for cid in ["A", "B", "C"]:
     clusters = clustering_objs[cid]["clusters"]
     t1_tasks = make_t1_coverage_tasks(cid, clusters, args.m_per_cluster, seed=args.seed + ord(cid))
-    validate_t1_coverage(t1_tasks, clusters, cid)
+    validate_t1_coverage(t1_tasks, doc_sets[cid], cid)
 
-    anchors = pick_anchor_tasks(t1_tasks, n_anchors=min(args.anchor_clusters_per_clustering, len(t1_tasks)),
-                                seed=args.seed + 1000 + ord(cid))
-    anchor_uids = set(t["task_uid"] for t in anchors)
-    pool = remove_tasks_by_uid(t1_tasks, anchor_uids)
+    anchors, pool = pick_anchor_tasks(t1_tasks, n_anchors=min(args.anchor_clusters_per_clustering, len(t1_tasks)),
+                                      seed=args.seed + 1000 + ord(cid))
 
     # mark pool
     for t in pool:
@@ -376,15 +420,15 @@ def main():
       seed=args.seed + 2000 + ord(cid)
     )
 
-  # Build T2 pair pools (unique)
+  # Build T2 pair pools (unique); deque so allocation pops from the front in O(1)
   pair_pool = {}
   for cid in ["A", "B", "C"]:
     clusters = clustering_objs[cid]["clusters"]
-    pair_pool[cid] = build_unique_pairs(
+    pair_pool[cid] = deque(build_unique_pairs(
       cid, clusters, n_pairs=args.pairs_pool_size,
       seed=args.seed + 3000 + ord(cid),
       pos_frac=0.5
-    )
+    ))
 
   # Prepare output folders
   out_assign = os.path.join(args.out, "assignments")
@@ -404,14 +448,13 @@ def main():
       "t2": "Unique pairs per clustering from a global pool; allocated by popping (no repeats across experts until pool exhausted)."
     }
   }
-  with open(os.path.join(out_assign, "manifest.json"), "w", encoding="utf-8") as f:
-    json.dump(manifest, f, ensure_ascii=False, indent=2)
+  outputs.append((os.path.join(out_assign, "manifest.json"), manifest))
 
   # Helper: pop k pairs safely
   def pop_pairs(cid: str, k: int) -> List[Dict]:
     out = []
     while k > 0 and pair_pool[cid]:
-      out.append(pair_pool[cid].pop(0))
+      out.append(pair_pool[cid].popleft())
       k -= 1
     return out
 
@@ -483,8 +526,11 @@ def main():
       "tasks": tasks
     }
 
-    with open(os.path.join(out_assign, f"{e}.json"), "w", encoding="utf-8") as f:
-      json.dump(assignment, f, ensure_ascii=False, indent=2)
+    outputs.append((os.path.join(out_assign, f"{e}.json"), assignment))
+
+  # Write all JSON files (I/O-bound: overlap encoding + disk writes)
+  with ThreadPoolExecutor(max_workers=4) as ex:
+    list(ex.map(lambda po: write_json(*po), outputs))
 
   print("OK: wrote clusterings + assignments to", args.out)
   print("T1 tasks per clustering (total/anchors/pool):")
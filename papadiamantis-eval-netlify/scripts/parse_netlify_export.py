@@ -13,8 +13,48 @@ Upgrades (v2):
 """
 
 import argparse, csv, json, os
+from itertools import islice
+from operator import itemgetter
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+  import orjson
+  _loads = orjson.loads
+except ImportError:
+  _loads = json.loads
+
+try:
+  import pyarrow as pa  # optional: multithreaded C++ CSV reader
+  import pyarrow.csv as pacsv
+except ImportError:
+  pa = pacsv = None
+
+
+# Netlify export column names can vary
+PAYLOAD_COLUMNS = ["payload", "Payload", "PAYLOAD"]
+TIMESTAMP_COLUMNS = ["Created", "created_at", "created", "Timestamp", "timestamp", "Date", "date"]
+
+# Output schemas (column order of the tidy CSVs)
+SUBMISSION_FIELDS = [
+  "kept", "reason", "expert_id", "assignment_id", "client_session_id", "submission_uuid",
+  "app_version", "primary_clustering_id", "submitted_at", "started_at", "finished_at", "ts_used",
+]
+_RATING_BASE_FIELDS = [
+  "expert_id", "assignment_id", "primary_clustering_id", "submitted_at", "app_version",
+  "client_session_id", "submission_uuid",
+  "task_key", "task_uid", "task_id", "assignment_role",
+  "clustering_id",
+]
+CLUSTER_FIELDS = _RATING_BASE_FIELDS + [
+  "cluster_id", "batch_index", "cluster_label", "cluster_note", "task_time_ms",
+]
+ITEM_FIELDS = _RATING_BASE_FIELDS + [
+  "cluster_id", "batch_index", "doc_id", "coherence", "misplaced", "note", "task_time_ms",
+]
+PAIR_FIELDS = _RATING_BASE_FIELDS + [
+  "pair_id", "doc1", "doc2", "same_cluster", "relatedness", "common_theme", "note", "task_time_ms",
+]
 
 
 def ensure_dir(p: str):
@@ -34,10 +74,11 @@ def parse_iso_ts(s: Optional[str]) -> Optional[datetime]:
     return None
 
 
-def best_row_timestamp(row: Dict[str, str], payload: Dict[str, Any]) -> datetime:
+def best_row_timestamp(ts_cells: List[str], payload: Dict[str, Any]) -> datetime:
   """
   Determine a stable timestamp for ordering submissions.
   Priority: payload.submitted_at > CSV created/created_at > now(UTC, as fallback).
+  ts_cells are the row's TIMESTAMP_COLUMNS values, in priority order.
   """
   # from payload
   t = parse_iso_ts(payload.get("submitted_at")) or parse_iso_ts(payload.get("finished_at"))
@@ -45,27 +86,61 @@ def best_row_timestamp(row: Dict[str, str], payload: Dict[str, Any]) -> datetime
     return t
 
   # from common Netlify CSV columns (varies)
-  for k in ["Created", "created_at", "created", "Timestamp", "timestamp", "Date", "date"]:
-    if k in row:
-      t2 = parse_iso_ts(row.get(k))
-      if t2:
-        return t2
+  for cell in ts_cells:
+    t2 = parse_iso_ts(cell)
+    if t2:
+      return t2
 
   # worst-case fallback: deterministic-ish but safe
   return datetime.now(timezone.utc)
 
 
-def get_payload_raw(row: Dict[str, str]) -> str:
-  # Netlify export column names can vary
-  for k in ["payload", "Payload", "PAYLOAD"]:
-    if k in row and (row.get(k) or "").strip():
-      return row.get(k) or ""
-  return ""
+def read_export_header(path: str) -> List[str]:
+  with open(path, "r", encoding="utf-8", newline="") as f:
+    return next(csv.reader(f), [])
+
+
+def iter_export_rows(path: str, columns: List[str]) -> Iterator[Sequence[str]]:
+  """
+  Yields each data row of the Netlify export CSV reduced to `columns` (header names, in that
+  order); a cell missing from a short row reads as "".
+  Streams pyarrow's CSV reader when installed (only `columns` converted, as strings, one
+  batch at a time), else the csv module. pyarrow can only skip or reject rows whose field
+  count differs from the header, so at the first such row the rest of the file is read with
+  the csv module, which keeps those rows.
+  """
+  done = 0
+  if pacsv is not None:
+    try:
+      # small blocks + the system allocator: only a few batches' worth of Arrow memory is live
+      batches = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=1 << 18),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(include_columns=columns,
+                                             column_types={c: pa.string() for c in columns}),
+        memory_pool=pa.system_memory_pool(),
+      )
+      for batch in batches:
+        for row in zip(*(col.to_pylist() for col in batch.columns)):
+          yield row
+          done += 1
+      return
+    except pa.ArrowInvalid:
+      pass
+
+  with open(path, "r", encoding="utf-8", newline="", buffering=1 << 20) as f:
+    reader = csv.reader(f)
+    header = next(reader, [])
+    idx = [header.index(c) for c in columns]
+    for row in islice(reader, done, None):
+      n = len(row)
+      yield tuple(row[i] if i < n else "" for i in idx)
 
 
 def safe_json_loads(s: str) -> Optional[Dict[str, Any]]:
   try:
-    obj = json.loads(s)
+    obj = _loads(s)
     if isinstance(obj, dict):
       return obj
     return None
@@ -77,45 +152,140 @@ def norm_str(x: Any) -> str:
   return ("" if x is None else str(x)).strip()
 
 
-def dedupe_key(payload: Dict[str, Any]) -> Tuple[str, str, str]:
-  expert_id = norm_str(payload.get("expert_id")) or "UNKNOWN_EXPERT"
-  assignment_id = norm_str(payload.get("assignment_id")) or "UNKNOWN_ASSIGNMENT"
-  client_session_id = norm_str(payload.get("client_session_id")) or "NO_SESSION"
-  return (expert_id, assignment_id, client_session_id)
-
-
 def build_task_index(tasks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
   """
-  Map keys -> task object for both task_uid and task_id.
+  Map keys -> task object for both task_uid and task_id (task_uid takes precedence).
   """
-  idx: Dict[str, Dict[str, Any]] = {}
-  for t in tasks or []:
-    tu = norm_str(t.get("task_uid"))
-    ti = norm_str(t.get("task_id"))
-    if tu:
-      idx[tu] = t
-    if ti and ti not in idx:
-      idx[ti] = t
+  tasks = tasks or []
+  # first task wins per task_id (reversed so earlier entries overwrite later ones)
+  idx = {ti: t for t in reversed(tasks) if (ti := norm_str(t.get("task_id")))}
+  idx.update({tu: t for t in tasks if (tu := norm_str(t.get("task_uid")))})
   return idx
 
 
-def write_csv(path: str, rows: List[Dict[str, Any]]):
+def write_csv(path: str, rows: List[Any], fieldnames: Optional[List[str]] = None):
+  """
+  rows are dicts, or tuples already laid out in fieldnames order (requires fieldnames).
+  """
   if not rows:
     return
-  # stable field order: union of keys (some rows may have extras)
-  fieldnames = []
-  seen = set()
-  for r in rows:
-    for k in r.keys():
-      if k not in seen:
-        fieldnames.append(k)
-        seen.add(k)
-
-  with open(path, "w", encoding="utf-8", newline="") as f:
-    w = csv.DictWriter(f, fieldnames=fieldnames)
-    w.writeheader()
+  explicit = fieldnames is not None
+  if not explicit:
+    # stable field order: union of keys (some rows may have extras)
+    fieldnames = []
+    seen = set()
     for r in rows:
-      w.writerow(r)
+      for k in r.keys():
+        if k not in seen:
+          fieldnames.append(k)
+          seen.add(k)
+
+  with open(path, "w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+    w = csv.writer(f)
+    w.writerow(fieldnames)
+    if not isinstance(rows[0], dict):
+      w.writerows(rows)
+    elif explicit and len(fieldnames) > 1:
+      # explicit schema: every row carries every field, so build row tuples in C
+      w.writerows(map(itemgetter(*fieldnames), rows))
+    else:
+      w.writerows([r.get(k, "") for k in fieldnames] for r in rows)
+
+
+def expand_record(rec: Dict[str, Any]) -> Tuple[List[Tuple], List[Tuple], List[Tuple]]:
+  """
+  Expand one submission into (item_rows, cluster_rows, pair_rows).
+  Rows are tuples laid out as ITEM_FIELDS / CLUSTER_FIELDS / PAIR_FIELDS.
+  """
+  item_rows: List[Tuple] = []
+  cluster_rows: List[Tuple] = []
+  pair_rows: List[Tuple] = []
+
+  p = rec["payload"]
+  expert_id = p.get("expert_id")
+  assignment_id = p.get("assignment_id")
+  submitted_at = p.get("submitted_at") or rec["ts_iso"]
+  app_version = p.get("app_version") or ""
+  submission_uuid = p.get("submission_uuid") or ""
+  client_session_id = p.get("client_session_id") or ""
+  primary_clustering_id = p.get("primary_clustering_id") or ""
+
+  tasks = p.get("tasks", []) or []
+  answers = p.get("answers", {}) or {}
+  task_time_ms = p.get("task_time_ms", {}) or {}
+
+  task_by_key = build_task_index(tasks)
+
+  # answers keys are task_uid (preferred) or task_id (fallback)
+  for task_key, ans in answers.items():
+    t = task_by_key.get(task_key, {}) or {}
+    ttype = t.get("type")
+
+    clustering_id = t.get("clustering_id")
+    role = t.get("assignment_role") or ""
+    task_uid = t.get("task_uid") or ""
+    task_id = t.get("task_id") or ""
+
+    time_ms = task_time_ms.get(task_key)
+    if time_ms is None:
+      # also try via task_uid/task_id alternative
+      tu = norm_str(task_uid)
+      ti = norm_str(task_id)
+      time_ms = task_time_ms.get(tu) if tu else None
+      if time_ms is None and ti:
+        time_ms = task_time_ms.get(ti)
+    time_ms = time_ms if time_ms is not None else ""
+
+    # _RATING_BASE_FIELDS, shared by every row of this task
+    base = (
+      expert_id, assignment_id, primary_clustering_id, submitted_at, app_version,
+      client_session_id, submission_uuid,
+      task_key, task_uid, task_id, role,
+      clustering_id,
+    )
+
+    if ttype == "cluster":
+      cluster_id = t.get("cluster_id")
+      batch_index = t.get("batch_index")
+      batch_index = batch_index if batch_index is not None else ""
+
+      cluster_rows.append(base + (
+        cluster_id, batch_index,
+        norm_str(ans.get("cluster_label")),
+        norm_str(ans.get("cluster_note")),
+        time_ms,
+      ))
+
+      item_base = base + (cluster_id, batch_index)
+      items = ans.get("items") or {}
+      for doc_id, ia in items.items():
+        item_rows.append(item_base + (
+          doc_id,
+          ia.get("coherence"),
+          1 if ia.get("misplaced") else 0,
+          norm_str(ia.get("note")),
+          time_ms,
+        ))
+
+    elif ttype == "pair":
+      doc1 = t.get("doc1")
+      doc2 = t.get("doc2")
+      pair_rows.append(base + (
+        t.get("pair_id") or "",
+        doc1.get("doc_id") if isinstance(doc1, dict) else "",
+        doc2.get("doc_id") if isinstance(doc2, dict) else "",
+        1 if t.get("same_cluster") else 0,
+        ans.get("relatedness"),
+        norm_str(ans.get("common_theme")),
+        norm_str(ans.get("note")),
+        time_ms,
+      ))
+
+    else:
+      # Unknown task types are ignored (future-proof)
+      pass
+
+  return item_rows, cluster_rows, pair_rows
 
 
 def main():
@@ -132,60 +302,76 @@ def main():
   submissions_raw: List[Dict[str, Any]] = []
   parse_errors = 0
 
-  with open(args.csv, "r", encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-      payload_raw = get_payload_raw(row)
-      if not payload_raw.strip():
-        continue
-
-      payload = safe_json_loads(payload_raw)
-      if not payload:
-        parse_errors += 1
-        continue
-
-      # normalize core fields
-      payload["expert_id"] = norm_str(payload.get("expert_id"))
-      payload["assignment_id"] = norm_str(payload.get("assignment_id"))
-      payload["app_version"] = norm_str(payload.get("app_version"))
-      payload["submission_uuid"] = norm_str(payload.get("submission_uuid"))
-      payload["client_session_id"] = norm_str(payload.get("client_session_id"))
-
-      ts = best_row_timestamp(row, payload)
-      submissions_raw.append({
-        "row": row,
-        "payload": payload,
-        "ts": ts,
-        "dedupe_key": dedupe_key(payload),
-      })
+  # plain rows of just the payload + timestamp columns: no dict per row, nothing else converted
+  header = read_export_header(args.csv)
+  payload_col = next((k for k in PAYLOAD_COLUMNS if k in header), None)
+  ts_cols = [k for k in TIMESTAMP_COLUMNS if k in header]
+  if payload_col is None:
+    # empty export, or no payload column: nothing to parse (0 submissions, as with DictReader)
+    if header:
+      print(f"[WARN] No payload column in {args.csv} (expected one of {PAYLOAD_COLUMNS}); no submissions parsed.")
+    rows = iter(())
+  else:
+    rows = iter_export_rows(args.csv, [payload_col] + ts_cols)
+
+  # keep only the payload string and timestamp cells of each row
+  ts_cells: List[List[str]] = []
+  raws: List[str] = []
+  for payload_raw, *cells in rows:
+    if payload_raw.strip():
+      ts_cells.append(cells)
+      raws.append(payload_raw)
+
+  # parse all payloads in one tight pass; only when some payload is invalid
+  # fall back to per-row parsing so failures can be counted
+  try:
+    payloads = list(map(_loads, raws))
+  except ValueError:
+    payloads = [safe_json_loads(r) for r in raws]
+
+  for cells, payload in zip(ts_cells, payloads):
+    if not payload or not isinstance(payload, dict):
+      parse_errors += 1
+      continue
+
+    # normalize core fields (reused for the dedupe key below)
+    eid = payload["expert_id"] = norm_str(payload.get("expert_id"))
+    aid = payload["assignment_id"] = norm_str(payload.get("assignment_id"))
+    payload["app_version"] = norm_str(payload.get("app_version"))
+    payload["submission_uuid"] = norm_str(payload.get("submission_uuid"))
+    sid = payload["client_session_id"] = norm_str(payload.get("client_session_id"))
+
+    ts = best_row_timestamp(cells, payload)
+    submissions_raw.append({
+      "payload": payload,
+      "ts": ts,
+      "ts_iso": ts.isoformat(),
+      # dedupe key: (expert_id, assignment_id, client_session_id)
+      "dedupe_key": (eid or "UNKNOWN_EXPERT", aid or "UNKNOWN_ASSIGNMENT", sid or "NO_SESSION"),
+    })
 
   # Sort by timestamp ascending, then keep LAST as canonical
-  submissions_raw.sort(key=lambda x: x["ts"])
-
-  # Dedupe map: key -> index of kept record
-  kept_idx_by_key: Dict[Tuple[str, str, str], int] = {}
-  for i, rec in enumerate(submissions_raw):
-    kept_idx_by_key[rec["dedupe_key"]] = i  # last one wins
-
-  # Also guard against duplicated submission_uuid (rare but possible)
-  kept_idx_by_uuid: Dict[str, int] = {}
-  for i, rec in enumerate(submissions_raw):
-    su = norm_str(rec["payload"].get("submission_uuid"))
-    if su:
-      kept_idx_by_uuid[su] = i  # last wins
+  submissions_raw.sort(key=itemgetter("ts"))
 
+  # Dedupe in one reverse sweep: the first time a key (or submission_uuid) is seen
+  # from the end is its latest record. Also guards against duplicated
+  # submission_uuid (rare but possible).
+  seen_keys = set()
+  seen_uuids = set()
   submissions_rows: List[Dict[str, Any]] = []
   kept_records: List[Dict[str, Any]] = []
 
-  for i, rec in enumerate(submissions_raw):
+  for rec in reversed(submissions_raw):
     p = rec["payload"]
     key = rec["dedupe_key"]
-    is_latest_for_key = (kept_idx_by_key.get(key) == i)
+    is_latest_for_key = key not in seen_keys
+    seen_keys.add(key)
 
     su = norm_str(p.get("submission_uuid"))
     is_latest_for_uuid = True
     if su:
-      is_latest_for_uuid = (kept_idx_by_uuid.get(su) == i)
+      is_latest_for_uuid = su not in seen_uuids
+      seen_uuids.add(su)
 
     kept = bool(is_latest_for_key and is_latest_for_uuid)
     if kept:
@@ -203,138 +389,31 @@ def main():
       "submitted_at": p.get("submitted_at") or "",
       "started_at": p.get("started_at") or "",
       "finished_at": p.get("finished_at") or "",
-      "ts_used": rec["ts"].isoformat(),
+      "ts_used": rec["ts_iso"],
     })
 
+  # back to ascending timestamp order
+  submissions_rows.reverse()
+  kept_records.reverse()
+
   # Choose which records to expand into ratings
   records_for_ratings = submissions_raw if args.keep_duplicates else kept_records
 
-  item_rows: List[Dict[str, Any]] = []
-  cluster_rows: List[Dict[str, Any]] = []
-  pair_rows: List[Dict[str, Any]] = []
+  item_rows: List[Tuple] = []
+  cluster_rows: List[Tuple] = []
+  pair_rows: List[Tuple] = []
 
   for rec in records_for_ratings:
-    p = rec["payload"]
-    expert_id = p.get("expert_id")
-    assignment_id = p.get("assignment_id")
-    submitted_at = p.get("submitted_at") or rec["ts"].isoformat()
-    app_version = p.get("app_version") or ""
-    submission_uuid = p.get("submission_uuid") or ""
-    client_session_id = p.get("client_session_id") or ""
-    primary_clustering_id = p.get("primary_clustering_id") or ""
-
-    tasks = p.get("tasks", []) or []
-    answers = p.get("answers", {}) or {}
-    task_time_ms = p.get("task_time_ms", {}) or {}
-
-    task_by_key = build_task_index(tasks)
-
-    # answers keys are task_uid (preferred) or task_id (fallback)
-    for task_key, ans in answers.items():
-      t = task_by_key.get(task_key, {}) or {}
-      ttype = t.get("type")
-
-      clustering_id = t.get("clustering_id")
-      role = t.get("assignment_role") or ""
-
-      time_ms = task_time_ms.get(task_key)
-      if time_ms is None:
-        # also try via task_uid/task_id alternative
-        tu = norm_str(t.get("task_uid"))
-        ti = norm_str(t.get("task_id"))
-        time_ms = task_time_ms.get(tu) if tu else None
-        if time_ms is None and ti:
-          time_ms = task_time_ms.get(ti)
-
-      if ttype == "cluster":
-        cluster_id = t.get("cluster_id")
-        batch_index = t.get("batch_index")
-
-        cluster_rows.append({
-          "expert_id": expert_id,
-          "assignment_id": assignment_id,
-          "primary_clustering_id": primary_clustering_id,
-          "submitted_at": submitted_at,
-          "app_version": app_version,
-          "client_session_id": client_session_id,
-          "submission_uuid": submission_uuid,
-
-          "task_key": task_key,
-          "task_uid": t.get("task_uid") or "",
-          "task_id": t.get("task_id") or "",
-          "assignment_role": role,
-
-          "clustering_id": clustering_id,
-          "cluster_id": cluster_id,
-          "batch_index": batch_index if batch_index is not None else "",
-
-          "cluster_label": norm_str(ans.get("cluster_label")),
-          "cluster_note": norm_str(ans.get("cluster_note")),
-          "task_time_ms": time_ms if time_ms is not None else "",
-        })
-
-        items = ans.get("items") or {}
-        for doc_id, ia in items.items():
-          item_rows.append({
-            "expert_id": expert_id,
-            "assignment_id": assignment_id,
-            "primary_clustering_id": primary_clustering_id,
-            "submitted_at": submitted_at,
-            "app_version": app_version,
-            "client_session_id": client_session_id,
-            "submission_uuid": submission_uuid,
-
-            "task_key": task_key,
-            "task_uid": t.get("task_uid") or "",
-            "task_id": t.get("task_id") or "",
-            "assignment_role": role,
-
-            "clustering_id": clustering_id,
-            "cluster_id": cluster_id,
-            "batch_index": batch_index if batch_index is not None else "",
-
-            "doc_id": doc_id,
-            "coherence": ia.get("coherence"),
-            "misplaced": int(bool(ia.get("misplaced"))),
-            "note": norm_str(ia.get("note")),
-            "task_time_ms": time_ms if time_ms is not None else "",
-          })
-
-      elif ttype == "pair":
-        pair_rows.append({
-          "expert_id": expert_id,
-          "assignment_id": assignment_id,
-          "primary_clustering_id": primary_clustering_id,
-          "submitted_at": submitted_at,
-          "app_version": app_version,
-          "client_session_id": client_session_id,
-          "submission_uuid": submission_uuid,
-
-          "task_key": task_key,
-          "task_uid": t.get("task_uid") or "",
-          "task_id": t.get("task_id") or "",
-          "assignment_role": role,
-
-          "clustering_id": clustering_id,
-          "pair_id": t.get("pair_id") or "",
-          "doc1": (t.get("doc1") or {}).get("doc_id") if isinstance(t.get("doc1"), dict) else "",
-          "doc2": (t.get("doc2") or {}).get("doc_id") if isinstance(t.get("doc2"), dict) else "",
-          "same_cluster": int(bool(t.get("same_cluster"))),
-          "relatedness": ans.get("relatedness"),
-          "common_theme": norm_str(ans.get("common_theme")),
-          "note": norm_str(ans.get("note")),
-          "task_time_ms": time_ms if time_ms is not None else "",
-        })
-
-      else:
-        # Unknown task types are ignored (future-proof)
-        pass
+    items, clusters, pairs = expand_record(rec)
+    item_rows.extend(items)
+    cluster_rows.extend(clusters)
+    pair_rows.extend(pairs)
 
   # Write outputs
-  write_csv(os.path.join(args.out, "submissions.csv"), submissions_rows)
-  write_csv(os.path.join(args.out, "item_ratings.csv"), item_rows)
-  write_csv(os.path.join(args.out, "cluster_ratings.csv"), cluster_rows)
-  write_csv(os.path.join(args.out, "pair_ratings.csv"), pair_rows)
+  write_csv(os.path.join(args.out, "submissions.csv"), submissions_rows, SUBMISSION_FIELDS)
+  write_csv(os.path.join(args.out, "item_ratings.csv"), item_rows, ITEM_FIELDS)
+  write_csv(os.path.join(args.out, "cluster_ratings.csv"), cluster_rows, CLUSTER_FIELDS)
+  write_csv(os.path.join(args.out, "pair_ratings.csv"), pair_rows, PAIR_FIELDS)
 
   kept_n = sum(int(r["kept"]) for r in submissions_rows)
   print("OK:")
@@ -0,0 +1,45 @@
+# Helpers shared by the scripts/ validators (imported, not run directly).
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def load_json_many(paths):
+    # files are read in threads (I/O overlaps) and parsed here, one at a time
+    with ThreadPoolExecutor(max(len(paths), 1)) as ex:
+        blobs = list(ex.map(_read_bytes, paths))
+    return [_loads(b) for b in blobs]
+
+def load_assignments(adir, experts):
+    # {expert_id: parsed <adir>/<expert_id>.json}, in the order of `experts`
+    return dict(zip(experts, load_json_many([os.path.join(adir, f"{e}.json") for e in experts])))
+
+def norm_pair(d1, d2):
+    # canonical (smaller, larger) order for an unordered pair: one compare, no sort
+    return (d1, d2) if d1 <= d2 else (d2, d1)
+
+def collect_pair_owners(assigns):
+    # (pair_owners, dup_keys): unordered pair (norm_pair of doc_ids) -> experts holding it,
+    # one entry per pair task (an expert listed twice has the pair twice), and the pairs
+    # with more than one owner, in the order their second owner was seen
+    pair_owners = defaultdict(list)
+    dup_keys = []
+    for e, data in assigns.items():
+        for t in data.get("tasks", []):
+            if t.get("type") == "pair":
+                key = norm_pair(t["doc1"]["doc_id"], t["doc2"]["doc_id"])
+                owners = pair_owners[key]
+                owners.append(e)
+                if len(owners) == 2:
+                    dup_keys.append(key)
+    return pair_owners, dup_keys
@@ -1,4 +1,6 @@
+import os
 import shutil
+import stat
 from pathlib import Path
 
 SRC_ROOT = Path("papadiamantis-eval-netlify")
@@ -9,30 +11,85 @@ def copytree(src: Path, dst: Path):
         shutil.rmtree(dst)
     shutil.copytree(src, dst)
 
+def copy_if_changed(src, dst):
+    # copy2 preserves mtime exactly, so a dst copied from the current src has the same size
+    # and mtime_ns; any other dst (edited in place, restored with an older mtime) is re-copied
+    s = os.stat(src)
+    try:
+        d = os.lstat(dst)
+    except FileNotFoundError:
+        d = None
+    if d is not None and not stat.S_ISREG(d.st_mode):
+        # a directory / symlink / special file in the way: remove it, never copy into or through it
+        if stat.S_ISDIR(d.st_mode):
+            shutil.rmtree(dst)
+        else:
+            os.unlink(dst)
+        d = None
+    if d is not None and d.st_size == s.st_size and d.st_mtime_ns == s.st_mtime_ns:
+        return dst
+    return shutil.copy2(src, dst)
+
+def unlink_symlinks(root: Path):
+    # os.walk lists symlinked dirs but does not descend into them; removing every link up front
+    # keeps the copies below from writing through one to a path outside root
+    for dirpath, dirnames, filenames in os.walk(root):
+        for n in dirnames + filenames:
+            p = os.path.join(dirpath, n)
+            if os.path.islink(p):
+                os.unlink(p)
+
+def prune(root: Path, keep: set):
+    # delete everything under root that is not a kept regular file or a real directory
+    # (stale files, symlinks to files or dirs, other special entries), then empty directories
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        for n in filenames + dirnames:
+            p = Path(dirpath) / n
+            st = os.lstat(p) if os.path.lexists(p) else None
+            if st is None or stat.S_ISDIR(st.st_mode):
+                continue  # real directory: already handled (emptied / removed) by the walk
+            if stat.S_ISREG(st.st_mode) and p in keep:
+                continue
+            p.unlink()
+        if Path(dirpath) != root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+def _top_level_files(d, names):
+    # shutil.copytree ignore callback: skip subdirectories (only files directly under src)
+    return [n for n in names if os.path.isdir(os.path.join(d, n))]
+
+def _keep_assignment_files(d, names):
+    # shutil.copytree ignore callback: skip everything but E*.json + manifest.json
+    return [n for n in names if not (n.startswith("E") and n.endswith(".json")) and n != "manifest.json"]
+
 def main():
     if not SRC_ROOT.exists():
         raise SystemExit(f"Missing {SRC_ROOT}. Are you in repo root?")
 
-    # fresh site/
-    if SITE.exists():
-        shutil.rmtree(SITE)
-    (SITE / "assets").mkdir(parents=True, exist_ok=True)
-    (SITE / "data" / "assignments").mkdir(parents=True, exist_ok=True)
+    # incremental: unchanged files are not re-copied; anything not rebuilt is pruned below
+    built = set()
+
+    def copy(src, dst):
+        built.add(Path(dst))
+        return copy_if_changed(src, dst)
 
     # copy index + assets
-    shutil.copy2(SRC_ROOT / "index.html", SITE / "index.html")
-    for p in (SRC_ROOT / "assets").glob("*"):
-        if p.is_file():
-            shutil.copy2(p, SITE / "assets" / p.name)
+    SITE.mkdir(parents=True, exist_ok=True)
+    unlink_symlinks(SITE)
+    copy(SRC_ROOT / "index.html", SITE / "index.html")
+    shutil.copytree(SRC_ROOT / "assets", SITE / "assets",
+                    ignore=_top_level_files, copy_function=copy, dirs_exist_ok=True)
 
     # copy assignment JSONs only
-    assign_src = SRC_ROOT / "data" / "assignments"
-    for p in assign_src.glob("E*.json"):
-        shutil.copy2(p, SITE / "data" / "assignments" / p.name)
-    shutil.copy2(assign_src / "manifest.json", SITE / "data" / "assignments" / "manifest.json")
+    shutil.copytree(SRC_ROOT / "data" / "assignments", SITE / "data" / "assignments",
+                    ignore=_keep_assignment_files, copy_function=copy, dirs_exist_ok=True)
 
     # add simple 404 page (used by redirects)
     (SITE / "404.html").write_text("<!doctype html><meta charset='utf-8'><title>404</title><h1>404</h1>", encoding="utf-8")
+    built.add(SITE / "404.html")
+
+    # drop stale files (e.g. blocked paths from an older build)
+    prune(SITE, built)
 
     print("[OK] Built clean site/ directory.")
     print("Contents:")
@@ -1,7 +1,13 @@
 import json
 from pathlib import Path
+from functools import lru_cache
 from itertools import combinations
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 NEW_ASSIGNMENT_ID = "pap_eval_seed42_m5_pairs18_v2"
 
 # Original layout (before "site/" build step)
@@ -25,19 +31,33 @@ def first_existing(paths):
             return p
     raise FileNotFoundError(f"None of these paths exist: {paths}")
 
-def load_json(p: Path):
-    with p.open("r", encoding="utf-8") as f:
-        return json.load(f)
+def load_json(p: Path, cache: dict = None):
+    # cache: optional {path: parsed obj}, so each file is parsed once per run
+    if cache is not None and p in cache:
+        return cache[p]
+    if orjson is not None:
+        obj = orjson.loads(p.read_bytes())
+    else:
+        with p.open("r", encoding="utf-8") as f:
+            obj = json.load(f)
+    if cache is not None:
+        cache[p] = obj
+    return obj
 
 def save_json(p: Path, obj):
     p.parent.mkdir(parents=True, exist_ok=True)
-    with p.open("w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    if orjson is not None:
+        p.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with p.open("w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
 
 def unordered_pair(a, b):
-    return tuple(sorted((a, b)))
+    return (a, b) if a <= b else (b, a)
 
+@lru_cache(maxsize=None)
 def clustering_same_cluster_pairs(clustering_path: Path):
+    # cached per clustering file: several patches may target the same clustering
     data = load_json(clustering_path)
     pairs = []
     # expected: data["clusters"] = [{"cluster_id":..., "items":[{"doc_id":...}, ...]}, ...]
@@ -45,13 +65,13 @@ def clustering_same_cluster_pairs(clustering_path: Path):
         docs = [it["doc_id"] for it in c.get("items", []) if "doc_id" in it]
         for d1, d2 in combinations(docs, 2):
             pairs.append((d1, d2))
-    return pairs
+    return tuple(pairs)
 
-def collect_used_pairs(assign_dir: Path):
+def collect_used_pairs(efiles, cache: dict):
     used_global = set()
     per_expert = {}
-    for efile in sorted(assign_dir.glob("E*.json")):
-        e = load_json(efile)
+    for efile in efiles:
+        e = load_json(efile, cache)
         used = set()
         for t in e.get("tasks", []):
             if t.get("type") == "pair":
@@ -62,9 +82,10 @@ def collect_used_pairs(assign_dir: Path):
         per_expert[efile.stem] = used
     return used_global, per_expert
 
-def patch_one(assign_dir: Path, cluster_dir: Path, expert_id: str, task_id: str, clustering_id: str, want_same_cluster: bool, used_global: set):
+def patch_one(assign_dir: Path, cluster_dir: Path, expert_id: str, task_id: str, clustering_id: str, want_same_cluster: bool, used_global: set,
+              cache: dict, dirty: set):
     expert_path = assign_dir / f"{expert_id}.json"
-    e = load_json(expert_path)
+    e = load_json(expert_path, cache)
 
     # find task
     idx = None
@@ -91,16 +112,8 @@ def patch_one(assign_dir: Path, cluster_dir: Path, expert_id: str, task_id: str,
 
     candidates = clustering_same_cluster_pairs(clustering_path)
 
-    replacement = None
-    for a, b in candidates:
-        p = unordered_pair(a, b)
-        if p in used_global:
-            continue
-        # since candidates are within-cluster, same_cluster is true
-        if want_same_cluster and True is not True:
-            continue
-        replacement = (a, b)
-        break
+    # first unused candidate; since candidates are within-cluster, same_cluster is true
+    replacement = next((c for c in candidates if unordered_pair(*c) not in used_global), None)
 
     if replacement is None:
         raise RuntimeError(f"No unused replacement pair found for clustering {clustering_id}")
@@ -126,7 +139,7 @@ def patch_one(assign_dir: Path, cluster_dir: Path, expert_id: str, task_id: str,
     used_global.discard(old_pair)
     used_global.add(unordered_pair(new_d1, new_d2))
 
-    save_json(expert_path, e)
+    dirty.add(expert_path)
     print(f"[OK] Patched {expert_id} {task_id}: {old_pair} -> {unordered_pair(new_d1, new_d2)}")
 
 def main():
@@ -134,17 +147,28 @@ def main():
     cluster_dir = first_existing(CLUSTER_DIR_CANDIDATES)
     manifest_path = assign_dir / "manifest.json"
 
-    used_global, _ = collect_used_pairs(assign_dir)
+    # expert files are parsed once into cache and written once at the end (if changed)
+    cache = {}
+    dirty = set()
+
+    # expert files, listed and sorted once for every pass below
+    efiles = sorted(assign_dir.glob("E*.json"))
+    used_global, _ = collect_used_pairs(efiles, cache)
 
     # patch targets
     for p in PATCHES:
-        patch_one(assign_dir, cluster_dir, p["expert"], p["task_id"], p["clustering_id"], p["want_same_cluster"], used_global)
+        patch_one(assign_dir, cluster_dir, p["expert"], p["task_id"], p["clustering_id"], p["want_same_cluster"], used_global,
+                  cache, dirty)
 
     # unify assignment_id across experts
-    for efile in sorted(assign_dir.glob("E*.json")):
-        e = load_json(efile)
-        e["assignment_id"] = NEW_ASSIGNMENT_ID
-        save_json(efile, e)
+    for efile in efiles:
+        e = load_json(efile, cache)
+        if e.get("assignment_id") != NEW_ASSIGNMENT_ID:
+            e["assignment_id"] = NEW_ASSIGNMENT_ID
+            dirty.add(efile)
+
+    for efile in sorted(dirty):
+        save_json(efile, cache[efile])
 
     # update manifest
     if manifest_path.exists():